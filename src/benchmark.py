@@ -0,0 +1,60 @@
+import os
+import time
+import queue
+from ffmpeg_recorder import ScreenCapture
+
+first_frame_timeout_sec = 10
+
+
+def measure_start_latency(recorder: ScreenCapture, warm: bool):
+    """
+    Measure time from the start_recording call to the first frame sent to ffmpeg
+    :param recorder: Screen capture object
+    :param warm: Prepare the recording ahead (warm start) or let start_recording spawn everything (cold start)
+    :return: Start latency in seconds or None if no frame was recorded (e.g. ffmpeg exited early)
+    """
+    if warm:
+        recorder.prepare_recording()
+        time.sleep(0.5)  # Give ffmpeg and the capture threads time to reach their idle state
+
+    recorder.start_recording()
+    frame_recorded = recorder.first_frame_event.wait(timeout=first_frame_timeout_sec)
+    latency = recorder.start_latency if frame_recorded else None
+    recorder.stop_recording()
+
+    # Empty info queue, nobody else reads it here
+    try:
+        while True:
+            recorder.info_queue.get_nowait()
+    except queue.Empty:
+        pass
+
+    return latency
+
+
+def benchmark_start_latency(runs: int = 5):
+    recorder = ScreenCapture(verbose=0, probe_audio=False)
+    recorder.set_coordinates(0, 0, 640, 480)
+    recorder.set_create_contact_sheet(False)
+    recorder.output_file = "benchmark.mp4"
+
+    for warm in (False, True):
+        mode = "Warm" if warm else "Cold"
+        results = [measure_start_latency(recorder, warm) for _ in range(runs)]
+        latencies = [latency * 1000 for latency in results if latency is not None]
+
+        failed_runs = runs - len(latencies)
+        if failed_runs > 0:
+            print(f"(!) {mode} start: {failed_runs} of {runs} runs recorded no frame within {first_frame_timeout_sec}s")
+        if len(latencies) == 0:
+            continue
+
+        print(f"[BENCHMARK] {mode} start: mean {round(sum(latencies) / len(latencies), 2)}ms | "
+              f"min {round(min(latencies), 2)}ms | max {round(max(latencies), 2)}ms")
+
+    if os.path.exists(recorder.output_file):
+        os.remove(recorder.output_file)
+
+
+if __name__ == '__main__':
+    benchmark_start_latency()
@@ -0,0 +1,136 @@
+import cv2
+import numpy as np
+import threading
+import queue
+from utils import resize_image
+
+
+class ContactSheetWriter:
+    finish_timeout_sec = 10  # Max time to wait for the worker, recording must never hang on the contact sheet
+
+    def __init__(self, thumb_width: int = 320, thumb_height: int = 180, columns: int = 4, max_thumbs: int = 24,
+                 scene_threshold: float = 12.0, verbose: int = 1):
+        self.thumb_width = thumb_width
+        self.thumb_height = thumb_height
+        self.columns = columns
+        self.max_thumbs = max_thumbs
+        self.scene_threshold = scene_threshold  # Mean abs. grayscale difference that counts as a scene change
+        self.verbose = verbose
+
+        self.frame_queue = queue.Queue(maxsize=8)  # Bounded, capture thread never waits on the worker
+        self.worker_thread = None
+        self.thumbs = []  # List of (frame index, thumbnail as BGR numpy array)
+        self.last_signature = None  # Small grayscale version of the last kept frame for scene detection
+        self.sample_count = 0  # Number of samples received by the worker
+        self.sample_stride = 1  # Only every n-th sample is used, doubled whenever the thumbnails are thinned out
+
+    def start(self):
+        """
+        Start background worker that turns submitted frames into thumbnails
+        """
+        self.frame_queue = queue.Queue(maxsize=8)  # New queue, a timed out worker could still hold the old one
+        self.thumbs = []
+        self.last_signature = None
+        self.sample_count = 0
+        self.sample_stride = 1
+        self.worker_thread = threading.Thread(target=self._worker, args=(self.frame_queue,), daemon=True)
+        self.worker_thread.start()
+
+    def submit(self, capture, frame_index: int):
+        """
+        Hand a frame from the capture pipeline to the worker. Never blocks, frames are dropped if the worker is busy
+        :param capture: Capture object as grabbed by mss
+        :param frame_index: Index of the frame in the recording
+        """
+        try:
+            self.frame_queue.put_nowait((capture, frame_index))
+        except queue.Full:
+            pass
+
+    def finish(self, output_file: str):
+        """
+        Stop the worker after all submitted frames are processed and write the contact sheet
+        :param output_file: Path of the contact sheet image
+        :return: Path of the written file or None if no thumbnails were collected or writing failed
+        """
+        # Sentinel, worker stops after processing all frames before it
+        try:
+            self.frame_queue.put(None, timeout=ContactSheetWriter.finish_timeout_sec)
+        except queue.Full:
+            pass
+        self.worker_thread.join(timeout=ContactSheetWriter.finish_timeout_sec)
+
+        if self.worker_thread.is_alive():
+            if self.verbose >= 1:
+                print("(!) Contact sheet worker did not finish in time, no contact sheet written")
+            return None
+
+        if len(self.thumbs) == 0:
+            return None
+
+        sheet = self.build_sheet()
+        if not cv2.imwrite(output_file, sheet):
+            if self.verbose >= 1:
+                print(f"(!) Could not write contact sheet to {output_file}")
+            return None
+
+        if self.verbose >= 1:
+            print(f"[INFO] Contact sheet with {len(self.thumbs)} thumbnails written to {output_file}")
+        return output_file
+
+    def build_sheet(self):
+        """
+        Tile collected thumbnails into one image
+        :return: Contact sheet as BGR numpy array
+        """
+        rows = -(-len(self.thumbs) // self.columns)  # Ceil division
+        sheet = np.zeros((rows * self.thumb_height, self.columns * self.thumb_width, 3), dtype=np.uint8)
+
+        for i, (_, thumb) in enumerate(self.thumbs):
+            # Center thumbnail in its cell, aspect ratio is kept by resize_image
+            cell_y = (i // self.columns) * self.thumb_height + (self.thumb_height - thumb.shape[0]) // 2
+            cell_x = (i % self.columns) * self.thumb_width + (self.thumb_width - thumb.shape[1]) // 2
+            sheet[cell_y:cell_y + thumb.shape[0], cell_x:cell_x + thumb.shape[1]] = thumb
+
+        return sheet
+
+    def _worker(self, frame_queue):
+        while True:
+            item = frame_queue.get()
+            if item is None:
+                break
+
+            capture, frame_index = item
+
+            # Thinned out sampling, keeps the spread of thumbnails even over the whole recording
+            self.sample_count += 1
+            if (self.sample_count - 1) % self.sample_stride != 0:
+                continue
+
+            # A broken frame must not stop the worker, it only loses this sample
+            try:
+                self._process_frame(capture, frame_index)
+            except Exception as e:
+                if self.verbose >= 1:
+                    print(f"(!) Could not create thumbnail for frame {frame_index}:", e)
+
+    def _process_frame(self, capture, frame_index):
+        # Downscale first, all further work is done on the small image
+        img_array = cv2.cvtColor(np.asarray(capture), cv2.COLOR_BGRA2BGR)
+        thumb = resize_image(img_array, max_width=self.thumb_width, max_height=self.thumb_height)
+
+        # Scene change detection on a tiny grayscale signature
+        signature = cv2.resize(cv2.cvtColor(thumb, cv2.COLOR_BGR2GRAY), (32, 18), interpolation=cv2.INTER_AREA)
+        if self.last_signature is not None:
+            difference = np.mean(cv2.absdiff(signature, self.last_signature))
+            if difference < self.scene_threshold:
+                return
+
+        self.last_signature = signature
+        self.thumbs.append((frame_index, thumb))
+
+        # Keep the number of thumbnails bounded. Dropping every second one alone would thin out older thumbnails
+        # only, so the sampling stride is doubled as well to keep the spread even
+        if len(self.thumbs) > self.max_thumbs:
+            self.thumbs = self.thumbs[::2]
+            self.sample_stride *= 2
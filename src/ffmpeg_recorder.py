@@ -6,27 +6,66 @@ import threading
 import subprocess
 import queue
 import pyaudio
+from typing import Optional
+import os
+import uuid
+from contact_sheet import ContactSheetWriter
+from transcoder import TranscodeQueue
 
 
 class ScreenCapture:
-    def __init__(self, verbose: int = 1):
+    # ffmpeg output arguments of the intermediate video. Lossless and cheap to encode, but large on disk
+    intermediate_encoder_args = [
+        "-c:v", "libx264rgb",  # Encode video using H.264 without conversion to yuv
+        "-preset", "ultrafast",  # Compression speed
+        "-qp", "0",  # Lossless
+        "-c:a", "pcm_s16le",  # Keep audio uncompressed
+    ]
+
+    def __init__(self, verbose: int = 1, probe_audio: bool = True):
         self.coords = {"top": 0, "left": 0, "width": 1000, "height": 1000}
         self.verbose = verbose
         self.fps = 30
         self.recording_active = False
+        self.recording_paused = False
+        self.resume_event = threading.Event()  # Cleared while paused, capture threads block on it instead of polling
+        self.resume_event.set()
         self.video_rec_thread = None  # Thread for the recording loop
         self.audio_rec_thread = None
         self.audio_queue = queue.Queue()
         self.ffmpeg_process = None  # Subprocess for ffmpeg
         self.info_queue = queue.Queue()
+        self.output_file = "output.mp4"
+        self.recording_file = None  # File the running ffmpeg process writes to (temporary or intermediate file)
+        self.encoder_preset = "fast"
+        self.encoder_crf = 23
+
+        # Warm start: ffmpeg process and capture threads are spawned ahead and wait idle for the start event
+        self.recording_prepared = False
+        self.prepared_settings = None  # Settings the prepared session was created with
+        self.start_event = threading.Event()
+        self.start_request_time = 0  # Time of the last start_recording call (time.perf_counter)
+        self.start_latency = None  # Seconds from start_recording call to the first frame sent to ffmpeg
+        self.first_frame_event = threading.Event()
+
+        # Intermediate capture: Record to a fast lossless intermediate and transcode to the output file afterwards
+        self.intermediate_capture = False
+        self.transcode_queue = TranscodeQueue(verbose=verbose)
+        self.transcode_queue.resume_pending(os.path.dirname(self.output_file) or ".")
+
+        # Contact sheet: Frames from the capture loop are sampled and thumbnailed on a background worker
+        self.create_contact_sheet = True
+        self.contact_sheet_interval_sec = 1  # Time between frames handed to the contact sheet worker
+        self.contact_sheet_writer = ContactSheetWriter(verbose=verbose)
 
         # Audio
         self.pyaudio = pyaudio.PyAudio()
         self.format = pyaudio.paInt16   # Sample format (16-bit)
         self.channels = 2  # Stereo
         self.buffer_size = 1024
-        # Inital call. Get wasapi recording device, if none available, returns None
-        self.audio_rec_device = self.get_wasapi_recording_device()
+        # Inital call. Get wasapi recording device, if none available, returns None. Probing opens every stereo mix
+        # device and can be skipped if the device is set later by name (e.g. from a profile)
+        self.audio_rec_device = self.get_wasapi_recording_device() if probe_audio else None
         self.record_audio = True if self.audio_rec_device is not None else False
 
     def set_coordinates(self, top: int, left: int, width: int, height: int):
@@ -51,6 +90,133 @@ class ScreenCapture:
         """Set new fps value"""
         self.fps = fps
 
+    def set_encoder_settings(self, preset: str, crf: int):
+        """
+        Set libx264 settings of the final video
+        :param preset: Compression speed preset (e.g. "ultrafast", "fast", "slow")
+        :param crf: Quality (lower is better, 17–28 typical)
+        """
+        self.encoder_preset = preset
+        self.encoder_crf = crf
+
+    def set_output_dir(self, directory: str):
+        """Set directory the output file is written to and resume pending transcode jobs in it"""
+        os.makedirs(directory, exist_ok=True)
+        self.output_file = os.path.join(directory, os.path.basename(self.output_file))
+        self.transcode_queue.resume_pending(directory)
+
+    def set_audio_device(self, name: Optional[str], host_api: Optional[str] = None):
+        """
+        Set audio recording device by name, without probing all devices
+        :param name: Device name as reported by pyaudio or None to disable audio recording
+        :param host_api: Host api name of the device (e.g. "Windows WASAPI"). The same device is listed once per host
+        api, without it the first device with a matching name is used
+        :return: True if the device was found
+        """
+        self.audio_rec_device = None
+        if name is not None:
+            for i in range(self.pyaudio.get_device_count()):
+                dev_info = self.pyaudio.get_device_info_by_index(i)
+                if dev_info["name"] != name or dev_info["maxInputChannels"] <= 0:
+                    continue
+                if host_api is not None and self.get_host_api_name(dev_info) != host_api:
+                    continue
+
+                self.audio_rec_device = dev_info
+                break
+
+        self.record_audio = True if self.audio_rec_device is not None else False
+        return self.record_audio
+
+    def get_host_api_name(self, device: dict):
+        """Name of the host api a device belongs to"""
+        return self.pyaudio.get_host_api_info_by_index(device["hostApi"])["name"]
+
+    def get_profile(self):
+        """
+        Get current settings as session profile
+        :return: Profile dict
+        """
+        return {"region": dict(self.coords), "fps": self.fps,
+                "encoder": {"preset": self.encoder_preset, "crf": self.encoder_crf,
+                            "intermediate_capture": self.intermediate_capture},
+                "audio_device": self.audio_rec_device["name"] if self.audio_rec_device is not None else None,
+                "audio_host_api": self.get_host_api_name(self.audio_rec_device)
+                if self.audio_rec_device is not None else None,
+                "output_dir": os.path.dirname(self.output_file) or "."}
+
+    def apply_profile(self, profile: dict):
+        """
+        Apply settings of a session profile
+        :param profile: Profile dict as created by get_profile
+        """
+        self.set_coordinates(**profile["region"])
+        self.set_fps(profile["fps"])
+        self.set_encoder_settings(profile["encoder"]["preset"], profile["encoder"]["crf"])
+        self.set_intermediate_capture(profile["encoder"]["intermediate_capture"])
+        # Fall back to probing, if the saved device is not available anymore
+        if not self.set_audio_device(profile["audio_device"], profile.get("audio_host_api")) \
+                and profile["audio_device"] is not None:
+            if self.verbose >= 1:
+                print(f"(!) Audio device {profile['audio_device']} of profile not found, probing for a device")
+            self.audio_rec_device = self.get_wasapi_recording_device()
+            self.record_audio = True if self.audio_rec_device is not None else False
+        self.set_output_dir(profile["output_dir"])
+
+    def get_encoder_args(self):
+        """
+        ffmpeg output arguments of the final video
+        :return: Argument list
+        """
+        return [
+            "-c:v", "libx264",  # Encode video using H.264
+            "-preset", self.encoder_preset,  # Compression speed
+            "-crf", str(self.encoder_crf),  # Quality (lower is better, 17–28 typical)
+            "-pix_fmt", "yuv420p",  # Output pixel format for compatibility
+            "-c:a", "aac",  # Audio codec
+            "-b:a", "192k",  # Audio bitrate
+        ]
+
+    def get_session_settings(self):
+        """Settings that require a new ffmpeg process when changed"""
+        return (tuple(self.coords.values()), self.fps, self.intermediate_capture, tuple(self.get_encoder_args()),
+                self.output_file, self.record_audio, self.audio_rec_device["index"] if self.record_audio else None)
+
+    def set_create_contact_sheet(self, value: bool):
+        self.create_contact_sheet = value
+
+    def set_intermediate_capture(self, value: bool):
+        self.intermediate_capture = value
+
+    def get_temporary_file(self):
+        """
+        Unique path of a new temporary recording file. ffmpeg opens its output file on spawn, so a prepared process must
+        never write to the output file directly, it would truncate the last recording
+        """
+        root, ext = os.path.splitext(self.output_file)
+        return f"{root}_{self.get_unique_suffix()}.recording{ext}"
+
+    def get_intermediate_file(self):
+        """Unique path of a new intermediate file, so pending transcodes are never overwritten"""
+        return f"{os.path.splitext(self.output_file)[0]}_{self.get_unique_suffix()}.intermediate.mkv"
+
+    @staticmethod
+    def get_unique_suffix():
+        """Timestamp for readability plus random part, recordings can be prepared several times per second"""
+        return f"{time.strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:8]}"
+
+    def get_transcode_output_file(self, intermediate_file: str):
+        """
+        Final path of a transcoded intermediate. Derived from the unique intermediate name, so a transcode finishing
+        late never overwrites a newer recording in the output file
+        """
+        root = intermediate_file[:-len(".intermediate.mkv")]
+        return root + os.path.splitext(self.output_file)[1]
+
+    def get_contact_sheet_file(self):
+        """Path of the contact sheet image belonging to the output file"""
+        return f"{os.path.splitext(self.output_file)[0]}_contact_sheet.png"
+
     def capture_screen(self):
         """
         Capture one screenshot on the class defined screen coordinates
@@ -76,11 +242,27 @@ class ScreenCapture:
 
         return img_array
 
-    def start_recording(self):
+    def prepare_recording(self):
         """
-        Start recording action. Initializes ffmpeg process and starts main recording thread
+        Prepare recording for a warm start. Spawns the ffmpeg process and the recording threads, which open their
+        capture sessions and wait idle until start_recording is called
         """
-        self.recording_active = True
+        if self.recording_active:
+            return
+
+        # Settings could have changed since the last prepare
+        self.discard_prepared_recording()
+
+        self.recording_paused = False
+        self.resume_event.set()
+        self.start_event.clear()
+
+        if self.intermediate_capture:
+            self.recording_file = self.get_intermediate_file()
+            encoder_args = ScreenCapture.intermediate_encoder_args
+        else:
+            self.recording_file = self.get_temporary_file()  # Moved to the output file after recording
+            encoder_args = self.get_encoder_args()
 
         self.ffmpeg_process = subprocess.Popen(
             [
@@ -92,24 +274,20 @@ class ScreenCapture:
                 "-s", f"{self.coords["width"]}x{self.coords["height"]}",  # Frame size
                 "-r", str(self.fps),  # Frame rate
                 "-i", "pipe:0",  # Video input
-                "-c:v", "libx264",  # Encode video using H.264
-                "-preset", "fast",  # Compression speed
-                "-crf", "23",  # Quality (lower is better, 17–28 typical)
-                "-pix_fmt", "yuv420p",  # Output pixel format for compatibility
-                "-c:a", "aac",  # Audio codec
-                "-b:a", "192k",  # Audio bitrate
+                *encoder_args,  # Output encoding
                 "-f", "s16le",  # Raw PCM audio format
                 "-ar", "44100",  # Audio sample rate
                 "-ac", "2",  # Audio channels
                 "-i", "pipe:1",  # Audio input
                 "-loglevel", "info",  # Suppress all but errors
-                "output.mp4",  # Output file
+                self.recording_file,  # Output file
             ],
             stdin=subprocess.PIPE,
             bufsize=10 ** 8
         )
 
         # Start audio recording thread
+        self.audio_rec_thread = None
         if self.record_audio:
             self.audio_rec_thread = threading.Thread(target=self._audio_capture, args=(self.audio_queue,))
             self.audio_rec_thread.start()
@@ -118,24 +296,86 @@ class ScreenCapture:
         self.video_rec_thread = threading.Thread(target=self._video_capture, args=(self.info_queue,))
         self.video_rec_thread.start()
 
+        self.recording_prepared = True
+        self.prepared_settings = self.get_session_settings()
+
+    def discard_prepared_recording(self):
+        """
+        Stop idle threads and the ffmpeg process of a prepared recording, that was not started
+        """
+        if not self.recording_prepared:
+            return
+
+        self.recording_prepared = False
+        self.start_event.set()  # Threads finish right away, since recording is not active
+        self.video_rec_thread.join()
+        if self.audio_rec_thread is not None:
+            self.audio_rec_thread.join()
+
+        # ffmpeg did not receive any input yet, so there is no output to finalize
+        self.ffmpeg_process.kill()
+        self.ffmpeg_process.wait()
+        if os.path.exists(self.recording_file):
+            os.remove(self.recording_file)
+
+    def start_recording(self):
+        """
+        Start recording action. Uses the prepared recording if available, otherwise prepares a new one first
+        """
+        self.start_request_time = time.perf_counter()
+        self.start_latency = None
+        self.first_frame_event.clear()
+
+        # Cold start if nothing was prepared or the settings changed since
+        if not self.recording_prepared or self.prepared_settings != self.get_session_settings():
+            self.prepare_recording()
+        self.recording_prepared = False
+
+        # Keep the cpu free for capturing, transcodes use all cores
+        self.transcode_queue.hold()
+
+        # Start contact sheet worker
+        if self.create_contact_sheet:
+            self.contact_sheet_writer.start()
+
+        self.recording_active = True
+        self.start_event.set()
+
     def stop_recording(self):
         """
         Stop recording action. Stops main recording thread
         """
         self.recording_active = False
+        self.resume_event.set()  # Wake up paused threads so they can finish
         self.video_rec_thread.join()  # Wait for thread to finish and stop
         if self.record_audio:
             self.audio_rec_thread.join()
 
+    def pause_recording(self):
+        """
+        Pause recording action. Capture threads idle until resumed, the ffmpeg process keeps running
+        """
+        if not self.recording_active or self.recording_paused:
+            return
+
+        self.recording_paused = True
+        self.resume_event.clear()
+
+    def resume_recording(self):
+        """
+        Resume a paused recording into the same output file
+        """
+        if not self.recording_active or not self.recording_paused:
+            return
+
+        self.recording_paused = False
+        self.resume_event.set()
+
     def _video_capture(self, info_queue, verbose=True):
         """
         Record screen based on coordinates and fps set in class variables
         """
 
-        # Set initial time Parameters
-        time_per_frame = 1 / self.fps
-        next_frame_time = time.monotonic()
-
         # Capture object
         capture = None
 
@@ -143,6 +383,19 @@ class ScreenCapture:
         frame_skips = 0
         frames_written = 0  # Includes frame skips
 
+        # Open capture session ahead and wait for the start of the recording
+        sct = mss.mss()
+        self.start_event.wait()
+        if not self.recording_active:
+            # Prepared recording was discarded
+            sct.close()
+            return
+
+        # Set initial time Parameters
+        time_per_frame = 1 / self.fps
+        next_frame_time = time.monotonic()
+        next_sample_time = next_frame_time  # Next contact sheet sample is due at this time
+
         # Logging
         last_measure_time = time.monotonic()
         last_frame_count = 0
@@ -152,13 +405,36 @@ class ScreenCapture:
         # Capture Loop
         while self.recording_active:
 
+            # Handle pause. Blocks without grabbing or writing frames until resumed or stopped
+            if self.recording_paused:
+                pause_start_time = time.monotonic()
+                info_queue.put({"status": "paused", "time": round(pause_start_time - start_time)})
+                self.resume_event.wait()
+
+                # Rebase timestamps by the paused duration. Frames are timestamped by ffmpeg only by their count,
+                # so not catching up on missed frames leaves no gap in the output
+                paused_duration = time.monotonic() - pause_start_time
+                next_frame_time += paused_duration
+                next_sample_time += paused_duration
+                start_time += paused_duration
+                last_measure_time += paused_duration
+
+                if not self.recording_active:
+                    break
+
             # Calculate Time Parameters
             wait_time = next_frame_time - time.monotonic()  # Wait time before caputing next frame based on fps
 
             # Handle capturing screen in set intervals
             if wait_time >= 0 or capture is None:
                 time.sleep(max(0, wait_time))  # Wait for next frame time
-                capture = self.capture_screen()  # Capture screen
+                capture = sct.grab(self.coords)  # Capture screen
+
+                # Hand the first fresh capture at or after the sample time to the contact sheet worker. Sampling by
+                # time instead of frame index makes sure no sample is lost to a skipped (repeated) frame
+                if self.create_contact_sheet and time.monotonic() >= next_sample_time:
+                    self.contact_sheet_writer.submit(capture, frames_written)
+                    next_sample_time = max(next_sample_time + self.contact_sheet_interval_sec, time.monotonic())
             else:
                 # If last capture took to long, skip this capture and send last again
                 frame_skips += 1
@@ -167,6 +443,13 @@ class ScreenCapture:
             self.ffmpeg_process.stdin.write(capture.raw)
             frames_written += 1
 
+            # Measure time from the start request to the first frame
+            if frames_written == 1:
+                self.start_latency = time.perf_counter() - self.start_request_time
+                self.first_frame_event.set()
+                if self.verbose >= 2:
+                    print(f"[RECORDING] First frame after {round(self.start_latency * 1000, 1)}ms")
+
             # Add Audio to stream if set and available
             if self.record_audio and not self.audio_queue.empty():
                 audio_chunk = self.audio_queue.get()
@@ -198,6 +481,8 @@ class ScreenCapture:
             # Schedule next frame
             next_frame_time += time_per_frame
 
+        sct.close()
+
         # Update info queue
         info_queue.put({"status": "writing"})
 
@@ -205,23 +490,62 @@ class ScreenCapture:
         self.ffmpeg_process.stdin.close()
         self.ffmpeg_process.wait()
 
+        # Move finished recording to the output file. On failure the recording file is kept for inspection
+        recording_ok = self.ffmpeg_process.returncode == 0
+        if not recording_ok:
+            if self.verbose >= 1:
+                print(f"(!) ffmpeg failed with code {self.ffmpeg_process.returncode}, recording kept at "
+                      f"{self.recording_file}")
+        elif not self.intermediate_capture:
+            os.replace(self.recording_file, self.output_file)
+
+        # Finalize contact sheet. Thumbnails were created during recording, only tiling and writing is left
+        contact_sheet_file = None
+        if self.create_contact_sheet:
+            contact_sheet_file = self.contact_sheet_writer.finish(self.get_contact_sheet_file())
+
+        # Intermediate capture: Transcode in background, the transcode queue reports a separate "transcoded" status
+        transcode = None
+        output_file = self.output_file if recording_ok else None
+        self.transcode_queue.release()
+        if self.intermediate_capture and recording_ok:
+            output_file = self.get_transcode_output_file(self.recording_file)
+            queued = self.transcode_queue.submit(self.recording_file, output_file, self.get_encoder_args(),
+                                                 info_queue=info_queue)
+            transcode = "queued" if queued else "deferred"
+
         # Update info queue
-        info_queue.put({"status": "done"})
+        info_queue.put({"status": "done", "output_file": output_file,
+                        "contact_sheet": contact_sheet_file, "transcode": transcode})
 
     def _audio_capture(self, audio_queue):
         device_index = self.audio_rec_device["index"]
         sample_rate = int(self.audio_rec_device["defaultSampleRate"])
 
+        # Open stream ahead, but only start it with the recording, so no stale audio is buffered
         stream = self.pyaudio.open(
             format=self.format,
             channels=self.channels,
             rate=sample_rate,
             input=True,
             input_device_index=device_index,
-            frames_per_buffer=self.buffer_size
+            frames_per_buffer=self.buffer_size,
+            start=False
         )
 
+        self.start_event.wait()
+        if self.recording_active:
+            stream.start_stream()
+
         while self.recording_active:
+
+            # Handle pause. Stop the stream so no audio piles up in the device buffer while paused
+            if self.recording_paused:
+                stream.stop_stream()
+                self.resume_event.wait()
+                stream.start_stream()
+                continue  # Re-check if recording was stopped while paused
+
             audio_chunk = stream.read(self.buffer_size, exception_on_overflow=False)
             audio_queue.put(audio_chunk)
 
@@ -1,14 +1,24 @@
 import tkinter as tk
+from tkinter import simpledialog
 import pyautogui
 from utils import *
 from ffmpeg_recorder import ScreenCapture
+from profiles import ProfileStore
 from PIL import Image, ImageTk
 from typing import Optional
 import queue
 
 
 class TransparentSelector(tk.Toplevel):
-    def __init__(self):
+    default_refresh_rate = 60  # Assumed display refresh rate, Tk can't query it
+    snap_distance = 12  # Max distance in pixels for snapping selection edges to window bounds
+    nudge_step = 1  # Pixels per arrow key press (x10 with shift)
+
+    def __init__(self, refresh_rate: int = default_refresh_rate):
+        """
+        :param refresh_rate: Max redraws per second while dragging. Motion events in between are coalesced. This is a
+        fixed throttle, set it to the refresh rate of the display
+        """
         super().__init__()
 
         # Variable for returning selected area
@@ -19,6 +29,7 @@ class TransparentSelector(tk.Toplevel):
         screen_height = self.winfo_screenheight()
 
         self.overrideredirect(True)  # Remove title bar and borders
+        self.geometry(f"{screen_width}x{screen_height}+0+0")
         self.config(bg="white")
         self.attributes("-alpha", 0.15)
 
@@ -29,79 +40,185 @@ class TransparentSelector(tk.Toplevel):
         self.selection_canvas.bind("<ButtonRelease-1>", self.on_mouse_up)
         self.selection_canvas.bind("<Button-3>", self.on_right_mouse_btn)
         self.selection_canvas.bind("<Motion>", self.on_mouse_motion)
-        # self.selection_canvas.bind("<Escape>", self.end_selection)
+        self.bind("<Escape>", lambda e: self.cancel_selection())
+        self.bind("<Return>", lambda e: self.confirm_selection())
+        self.bind("<KP_Enter>", lambda e: self.confirm_selection())
+        for key, dx, dy in (("Left", -1, 0), ("Right", 1, 0), ("Up", 0, -1), ("Down", 0, 1)):
+            self.bind(f"<{key}>", lambda e, dx=dx, dy=dy: self.on_nudge(dx, dy))
+            self.bind(f"<Shift-{key}>", lambda e, dx=dx, dy=dy: self.on_nudge(dx * 10, dy * 10))
+        self.focus_force()
+
+        # Single persistent selection rectangle, moved with coords instead of being recreated on every motion
+        self.selection_rect = self.selection_canvas.create_rectangle(0, 0, 0, 0, outline="red", width=3, fill="black",
+                                                                     state="hidden")
+        self.hint_text = self.selection_canvas.create_text(screen_width // 2, 40, fill="black", state="hidden",
+                                                           font=("TkDefaultFont", 16, "bold"),
+                                                           text="Arrow keys: move | Enter: confirm | Esc: cancel")
+        self.redraw_job = None  # Pending coalesced redraw
+        self.frame_interval_ms = max(1, round(1000 / refresh_rate))
 
         self.active_draw = False  # Currently in progress of drawing the area
         self.selection_made = False  # Was a full area selection made
         self.start_pos_x = 0
         self.start_pos_y = 0
-
-        # Actual cursor coordinates differ between canvas and windows
-        self.actual_cursor_start_x = 0
-        self.actual_cursor_start_y = 0
-        self.actual_cursor_end_x = 0
-        self.actual_cursor_end_y = 0
+        self.end_pos_x = 0
+        self.end_pos_y = 0
+        self.pointer_x = 0  # Last cursor position on the canvas, end position is derived from it
+        self.pointer_y = 0
+        self.nudge_x = 0  # Keyboard offset applied on top of the cursor position
+        self.nudge_y = 0
+
+        # Canvas and screen coordinates differ by window position and DPI scaling. Mapping is calculated only once
+        self.update_idletasks()
+        screen_size = pyautogui.size()
+        self.origin_x, self.origin_y = self.winfo_rootx(), self.winfo_rooty()
+        self.scale_x = screen_size[0] / screen_width
+        self.scale_y = screen_size[1] / screen_height
+
+        # Window bounds (in canvas coordinates) for edge snapping
+        self.snap_edges_x, self.snap_edges_y = self.get_window_edges()
+
+    def canvas_to_screen(self, x, y):
+        """
+        Map canvas coordinates to screen coordinates as used by the screen capture
+        :return: Tuple of screen x and y coordinate
+        """
+        return round((x + self.origin_x) * self.scale_x), round((y + self.origin_y) * self.scale_y)
+
+    def get_window_edges(self):
+        """
+        Collect edges of all visible windows, if the platform supports listing windows (pygetwindow on Windows)
+        :return: Tuple of x edge list and y edge list in canvas coordinates
+        """
+        edges_x, edges_y = [], []
+        try:
+            windows = pyautogui.getAllWindows()
+        except Exception:
+            return edges_x, edges_y
+
+        for window in windows:
+            if window.width <= 0 or window.height <= 0 or window.isMinimized:
+                continue
+            edges_x += [window.left / self.scale_x - self.origin_x, window.right / self.scale_x - self.origin_x]
+            edges_y += [window.top / self.scale_y - self.origin_y, window.bottom / self.scale_y - self.origin_y]
+
+        return edges_x, edges_y
+
+    @staticmethod
+    def snap(value, edges, distance):
+        """
+        Snap value to the closest edge within distance
+        :return: Snapped value or the unchanged value if no edge is close enough
+        """
+        closest = min(edges, key=lambda edge: abs(edge - value), default=None)
+        if closest is not None and abs(closest - value) <= distance:
+            return round(closest)
+        return value
 
     def on_mouse_down(self, event):
-        self.start_pos_x = event.x
-        self.start_pos_y = event.y
+        self.start_pos_x = self.snap(event.x, self.snap_edges_x, TransparentSelector.snap_distance)
+        self.start_pos_y = self.snap(event.y, self.snap_edges_y, TransparentSelector.snap_distance)
+        self.end_pos_x, self.end_pos_y = self.start_pos_x, self.start_pos_y
+        self.pointer_x, self.pointer_y = event.x, event.y
+        self.nudge_x, self.nudge_y = 0, 0
         self.active_draw = True
+        self.selection_made = False  # Drawing a new area replaces a previous, unconfirmed selection
+        self.selection_canvas.itemconfigure(self.hint_text, state="hidden")
 
-        self.actual_cursor_start_x, self.actual_cursor_start_y = pyautogui.position()
+        self.selection_canvas.coords(self.selection_rect, self.start_pos_x, self.start_pos_y,
+                                     self.start_pos_x, self.start_pos_y)
+        self.selection_canvas.itemconfigure(self.selection_rect, state="normal")
 
     def on_mouse_up(self, event):
+        # Selection stays editable with the arrow keys until it is confirmed with enter
         if self.active_draw:
+            self.set_end_position(event.x, event.y)
             self.active_draw = False
             self.selection_made = True
-            self.end_selection()
+            self.selection_canvas.itemconfigure(self.hint_text, state="normal")
 
     def on_mouse_motion(self, event):
-        self.actual_cursor_end_x, self.actual_cursor_end_y = pyautogui.position()
-        if self.start_pos_x <= event.x:
-            start_x, end_x = self.start_pos_x, event.x
-        else:
-            start_x, end_x = event.x, self.start_pos_x
+        # Nothing to do without an active drag
+        if not self.active_draw:
+            return
 
-        if self.start_pos_y <= event.y:
-            start_y, end_y = self.start_pos_y, event.y
-        else:
-            start_y, end_y = event.y, self.start_pos_y
+        # Only store the position, redrawing happens at most once per display frame
+        self.set_end_position(event.x, event.y, redraw=False)
+        if self.redraw_job is None:
+            self.redraw_job = self.after(self.frame_interval_ms, self.redraw_selection)
+
+    def on_nudge(self, dx, dy):
+        dx, dy = dx * TransparentSelector.nudge_step, dy * TransparentSelector.nudge_step
 
+        # While drawing, move the end corner
         if self.active_draw:
-            self.selection_canvas.delete("all")
-            self.selection_canvas.create_rectangle(start_x, start_y, end_x, end_y, outline="red", width=3, fill="black")
+            self.nudge_x += dx
+            self.nudge_y += dy
+            self.set_end_position(self.pointer_x, self.pointer_y)
+
+        # After drawing, move the whole selection
+        elif self.selection_made:
+            self.start_pos_x += dx
+            self.start_pos_y += dy
+            self.end_pos_x += dx
+            self.end_pos_y += dy
+            self.redraw_selection()
+
+    def set_end_position(self, x, y, redraw=True):
+        self.pointer_x, self.pointer_y = x, y
+        self.end_pos_x = self.snap(x, self.snap_edges_x, TransparentSelector.snap_distance) + self.nudge_x
+        self.end_pos_y = self.snap(y, self.snap_edges_y, TransparentSelector.snap_distance) + self.nudge_y
+        if redraw:
+            self.redraw_selection()
+
+    def cancel_redraw(self):
+        if self.redraw_job is not None:
+            self.after_cancel(self.redraw_job)
+            self.redraw_job = None
+
+    def redraw_selection(self):
+        self.cancel_redraw()
+        self.selection_canvas.coords(self.selection_rect, min(self.start_pos_x, self.end_pos_x),
+                                     min(self.start_pos_y, self.end_pos_y), max(self.start_pos_x, self.end_pos_x),
+                                     max(self.start_pos_y, self.end_pos_y))
 
     def on_right_mouse_btn(self, event):
-        if not self.active_draw:
+        if not self.active_draw and not self.selection_made:
             self.end_selection()
 
         else:
             self.reset_selection()
 
+    def confirm_selection(self):
+        if self.selection_made and not self.active_draw:
+            self.end_selection()
+
+    def cancel_selection(self):
+        self.selection_made = False
+        self.end_selection()
+
     def reset_selection(self):
-        # Delete canvas drawings
-        self.selection_canvas.delete("all")
+        # Hide selection rectangle
+        self.cancel_redraw()
+        self.selection_canvas.itemconfigure(self.selection_rect, state="hidden")
+        self.selection_canvas.itemconfigure(self.hint_text, state="hidden")
 
         # Reset draw variables
         self.active_draw = False  # Currently in progress of drawing the area
         self.selection_made = False
         self.start_pos_x = 0
         self.start_pos_y = 0
-
-        # Reset actual cursor variables
-        self.actual_cursor_start_x = 0
-        self.actual_cursor_start_y = 0
-        self.actual_cursor_end_x = 0
-        self.actual_cursor_end_y = 0
+        self.end_pos_x = 0
+        self.end_pos_y = 0
+        self.pointer_x = 0
+        self.pointer_y = 0
+        self.nudge_x = 0
+        self.nudge_y = 0
 
     def end_selection(self):
         if self.selection_made:
-            """
-            print(f"Selected Area: ({self.actual_cursor_start_x}, {self.actual_cursor_start_y}) to "
-                  f"({self.actual_cursor_end_x}, {self.actual_cursor_end_y})")
-            """
-            self.selected_area = [self.actual_cursor_start_x, self.actual_cursor_start_y,
-                                  self.actual_cursor_end_x, self.actual_cursor_end_y]
+            self.selected_area = [*self.canvas_to_screen(self.start_pos_x, self.start_pos_y),
+                                  *self.canvas_to_screen(self.end_pos_x, self.end_pos_y)]
 
         else:
             """
@@ -109,6 +226,7 @@ class TransparentSelector(tk.Toplevel):
             """
             self.selected_area = []
 
+        self.cancel_redraw()  # A pending redraw would fire on the destroyed window
         self.destroy()
 
 
@@ -126,7 +244,10 @@ class App(tk.Tk):
         self.title("Snip Recorder")
         self.resizable(False, False)
 
-        self.recorder = ScreenCapture()
+        # Audio probing is skipped if the last profile defines the audio device
+        self.profile_store = ProfileStore()
+        last_profile = self.profile_store.get_last()
+        self.recorder = ScreenCapture(probe_audio=last_profile is None)
 
         self.control_frame = tk.Frame(self, bg=App.colors["control_bg"])
         self.control_frame.pack(side="top")
@@ -168,7 +289,43 @@ class App(tk.Tk):
                                               relief="flat", bd=0, activebackground=App.colors["control_fg"])
         self.select_fps_btn.pack(side="left", fill="y", ipadx=6, ipady=6)
 
+        # Divider
+        tk.Frame(self.control_frame, bg=App.colors["preview_bg"]).pack(side="left", fill="y")
+
+        # Direct: encode final video while recording, Intermediate: fast lossless capture and transcode afterwards
+        self.mode_options = ["Direct", "Intermediate"]
+        self.selected_mode = tk.StringVar(value=self.mode_options[0])
+
+        self.select_mode_btn = tk.OptionMenu(self.control_frame, self.selected_mode, *self.mode_options,
+                                             command=self.on_mode_select)
+        self.select_mode_btn.configure(bg=self.control_frame.cget("bg"), fg=App.colors["control_txt"], cursor="hand2",
+                                       relief="flat", bd=0, highlightthickness=0, indicatoron=0, compound="right",
+                                       activeforeground=App.colors["control_txt"], image=self.options_arrow_down,
+                                       activebackground=App.colors["control_fg"])
+        self.select_mode_btn["menu"].configure(bg=self.control_frame.cget("bg"), fg=App.colors["control_txt"],
+                                               relief="flat", bd=0, activebackground=App.colors["control_fg"])
+        self.select_mode_btn.pack(side="left", fill="y", ipadx=6, ipady=6)
+
+        # Divider
+        tk.Frame(self.control_frame, bg=App.colors["preview_bg"]).pack(side="left", fill="y")
 
+        self.selected_profile = tk.StringVar(value="No Profile")
+        self.select_profile_btn = tk.OptionMenu(self.control_frame, self.selected_profile, "")
+        self.select_profile_btn.configure(bg=self.control_frame.cget("bg"), fg=App.colors["control_txt"],
+                                          cursor="hand2", relief="flat", bd=0, highlightthickness=0, indicatoron=0,
+                                          compound="right", activeforeground=App.colors["control_txt"],
+                                          image=self.options_arrow_down, activebackground=App.colors["control_fg"])
+        self.select_profile_btn["menu"].configure(bg=self.control_frame.cget("bg"), fg=App.colors["control_txt"],
+                                                  relief="flat", bd=0, activebackground=App.colors["control_fg"])
+        self.select_profile_btn.pack(side="left", fill="y", ipadx=6, ipady=6)
+        self.update_profile_options()
+
+        self.save_profile_btn = tk.Button(self.control_frame, text="Save Profile", command=self.on_save_profile,
+                                          cursor="hand2", relief="flat", bd=0, bg=self.control_frame.cget("bg"),
+                                          fg=App.colors["control_txt"])
+        self.save_profile_btn.pack(side="left", fill="y", ipadx=6, ipady=6)
+        self.save_profile_btn.bind("<Enter>", lambda e: self.save_profile_btn.configure(bg=App.colors["control_fg"]))
+        self.save_profile_btn.bind("<Leave>", lambda e: self.save_profile_btn.configure(bg=App.colors["control_bg"]))
 
         # Divider
         tk.Frame(self.control_frame, bg=App.colors["preview_bg"]).pack(side="left", fill="y")
@@ -183,6 +340,16 @@ class App(tk.Tk):
         self.record_btn.bind("<Enter>", lambda e: self.record_btn.configure(bg=App.colors["control_fg"]))
         self.record_btn.bind("<Leave>", lambda e: self.record_btn.configure(bg=App.colors["control_bg"]))
 
+        # Divider
+        tk.Frame(self.control_frame, bg=App.colors["preview_bg"]).pack(side="left", fill="y")
+
+        self.pause_btn = tk.Button(self.control_frame, text="Pause", command=self.on_pause_button, cursor="hand2",
+                                   relief="flat", bd=0, bg=self.control_frame.cget("bg"), fg=App.colors["control_txt"],
+                                   state="disabled")
+        self.pause_btn.pack(side="left", fill="y", ipadx=6, ipady=6)
+        self.pause_btn.bind("<Enter>", lambda e: self.pause_btn.configure(bg=App.colors["control_fg"]))
+        self.pause_btn.bind("<Leave>", lambda e: self.pause_btn.configure(bg=App.colors["control_bg"]))
+
         self.area_preview_frame = tk.Frame(self, height=300, bg=App.colors["preview_bg"])
         self.area_preview_frame.pack(fill="x")
         self.area_preview_frame.pack_propagate(False)
@@ -199,8 +366,17 @@ class App(tk.Tk):
                                    bg=self.info_frame.cget("bg"))
         self.info_label.pack(side="left", fill="y")
 
+        self.protocol("WM_DELETE_WINDOW", self.on_close)
+
         """INIT CALLS"""
         self.update_info_text(text="Click Define Area to set the part of the screen you want to capture")
+        self.recording_info_update_loop()  # Single poller for the info queue, runs for the lifetime of the app
+
+        # Warm start with the last used profile
+        if last_profile is not None:
+            self.update_idletasks()  # Preview size depends on the frame size
+            self.selected_profile.set(self.profile_store.last_profile)
+            self.load_profile(last_profile)
 
     def on_fps_select(self, selected_value):
 
@@ -210,6 +386,60 @@ class App(tk.Tk):
         # Update the StringVar to show the selected value with "FPS"
         self.selected_fps.set(f"{selected_value} FPS")
 
+        # Prepared recording has to be recreated with the new frame rate
+        if self.recorder.recording_prepared:
+            self.recorder.prepare_recording()
+
+    def on_mode_select(self, selected_value):
+
+        self.recorder.set_intermediate_capture(selected_value == "Intermediate")
+        print("[INFO] Set recording mode to", selected_value)
+
+        # Prepared recording has to be recreated for the other output format
+        if self.recorder.recording_prepared:
+            self.recorder.prepare_recording()
+
+    def update_profile_options(self):
+        menu = self.select_profile_btn["menu"]
+        menu.delete(0, "end")
+        for name in self.profile_store.get_names():
+            menu.add_command(label=name, command=lambda n=name: self.on_profile_select(n))
+
+    def on_profile_select(self, name):
+        profile = self.profile_store.get(name)
+        if profile is not None:
+            self.selected_profile.set(name)
+            self.load_profile(profile)
+
+    def on_save_profile(self):
+        name = simpledialog.askstring("Save Profile", "Profile name:", parent=self)
+        if not name:
+            return
+
+        self.profile_store.set(name, self.recorder.get_profile())
+        self.update_profile_options()
+        self.selected_profile.set(name)
+        print(f"[INFO] Saved profile {name}")
+
+    def load_profile(self, profile: dict):
+        if self.recorder.recording_active:
+            return
+
+        self.recorder.apply_profile(profile)
+        self.selected_fps.set(f"{profile['fps']} FPS")
+        self.selected_mode.set("Intermediate" if profile["encoder"]["intermediate_capture"] else "Direct")
+
+        # Set area preview and prepare recording for a warm start
+        region = profile["region"]
+        self.set_new_recording_area(region["left"], region["top"], region["left"] + region["width"],
+                                    region["top"] + region["height"])
+
+    def on_close(self):
+        if self.recorder.recording_active:
+            self.recorder.stop_recording()
+        self.recorder.discard_prepared_recording()  # Don't leave an idle ffmpeg process behind
+        self.destroy()
+
     def update_info_text(self, text: Optional[str] = None, color: Optional[str] = None, image: Optional[Image] = None):
 
         if text is not None:
@@ -230,14 +460,25 @@ class App(tk.Tk):
         if not self.recorder.recording_active:
             # Change Button Appearance:
             self.record_btn.configure(text=" Stop Recording", image=self.record_btn_stop_img)
+            self.pause_btn.configure(text="Pause", state="normal")
             self.recorder.start_recording()
-            self.recording_info_update_loop()
             self.update_info_text(text="Initializing Recording")
 
         else:
             # Change Button Appearance:
             self.record_btn.configure(text=" Start Recording", image=self.record_btn_start_img)
+            self.pause_btn.configure(text="Pause", state="disabled")
             self.recorder.stop_recording()
+            self.recorder.prepare_recording()  # Warm start for the next recording
+
+    def on_pause_button(self):
+        if not self.recorder.recording_paused:
+            self.pause_btn.configure(text="Resume")
+            self.recorder.pause_recording()
+
+        else:
+            self.pause_btn.configure(text="Pause")
+            self.recorder.resume_recording()
 
     def recording_info_update_loop(self):
         try:
@@ -245,8 +486,28 @@ class App(tk.Tk):
                 update = self.recorder.info_queue.get_nowait()
 
                 if update["status"] == "done":
-                    self.update_info_text(text="Recording finished", color=App.colors["control_txt"])
-                    return  # Stop polling when listener signals completion
+                    text = "Recording finished"
+                    if update["output_file"] is None:
+                        text = "Recording failed"
+                    if update.get("transcode") == "queued":
+                        text += ", transcoding in background"
+                    elif update.get("transcode") == "deferred":
+                        text += ", transcode queue full, transcoding on next start"
+                    if update.get("contact_sheet") is not None:
+                        text += f", contact sheet saved to {update['contact_sheet']}"
+                    self.update_info_text(text=text, color=App.colors["control_txt"])
+                elif update["status"] == "transcoded":
+                    # Background transcode of an earlier recording, must not overwrite the status of a running one
+                    if update["output_file"] is not None:
+                        text = f"Transcode finished, saved to {update['output_file']}"
+                    else:
+                        text = "Transcode failed, intermediate file is kept"
+                    print("[INFO]", text)
+                    if not self.recorder.recording_active:
+                        self.update_info_text(text=text, color=App.colors["control_txt"])
+                elif update["status"] == "paused":
+                    self.update_info_text(text=f"Recording paused, {update['time']}s elapsed",
+                                          color=App.colors["control_txt"])
                 elif update["status"] == "writing":
                     self.update_info_text(text="Finalizing Recording")
                 else:
@@ -274,8 +535,9 @@ class App(tk.Tk):
         self.preview_img = ImageTk.PhotoImage(Image.fromarray(resized_img))
         self.area_preview_img.configure(image=self.preview_img)
 
-        # Set record button to normal
+        # Set record button to normal and prepare recording for a warm start
         self.record_btn.configure(state="normal")
+        self.recorder.prepare_recording()
 
 
 if __name__ == '__main__':
@@ -0,0 +1,117 @@
+import os
+import json
+from typing import Optional
+
+
+class ProfileStore:
+    default_file = os.path.join(os.path.expanduser("~"), ".snip_recorder.json")
+
+    def __init__(self, file: Optional[str] = None, verbose: int = 1):
+        self.file = file if file is not None else ProfileStore.default_file
+        self.verbose = verbose
+        self.profiles = {}  # Profile name -> profile dict (see ScreenCapture.get_profile)
+        self.last_profile = None  # Name of the profile used last, loaded on startup
+        self.load()
+
+    def load(self):
+        """
+        Load profiles from config file. Missing or broken config files result in no profiles
+        """
+        try:
+            with open(self.file) as f:
+                config = json.load(f)
+        except FileNotFoundError:
+            return
+        except (json.JSONDecodeError, OSError) as e:
+            if self.verbose >= 1:
+                print(f"(!) Could not read profiles from {self.file}:", e)
+            return
+
+        if not isinstance(config, dict) or not isinstance(config.get("profiles", {}), dict):
+            if self.verbose >= 1:
+                print(f"(!) Could not read profiles from {self.file}: unexpected format")
+            return
+
+        # Skip invalid profiles, a single broken entry should not prevent loading the others
+        for name, profile in config.get("profiles", {}).items():
+            if self.is_valid(profile):
+                self.profiles[name] = profile
+            elif self.verbose >= 1:
+                print(f"(!) Skipped invalid profile {name}")
+
+        if isinstance(config.get("last_profile"), str) and config["last_profile"] in self.profiles:
+            self.last_profile = config["last_profile"]
+
+    @staticmethod
+    def is_valid(profile):
+        """
+        Check if profile has all keys and value types required by ScreenCapture.apply_profile
+        :param profile: Loaded profile
+        :return: True if the profile can be applied
+        """
+        if not isinstance(profile, dict):
+            return False
+
+        def is_int(value):
+            return isinstance(value, int) and not isinstance(value, bool)  # bool is a subclass of int
+
+        def is_optional_str(value):
+            return value is None or isinstance(value, str)
+
+        region, encoder = profile.get("region"), profile.get("encoder")
+        valid = (isinstance(region, dict) and all(is_int(region.get(key)) for key in ("top", "left", "width", "height"))
+                 and is_int(profile.get("fps"))
+                 and isinstance(encoder, dict) and isinstance(encoder.get("preset"), str)
+                 and is_int(encoder.get("crf")) and isinstance(encoder.get("intermediate_capture"), bool)
+                 and is_optional_str(profile.get("audio_device")) and is_optional_str(profile.get("audio_host_api"))
+                 and isinstance(profile.get("output_dir"), str))
+        if not valid:
+            return False
+
+        # Output directory has to exist (or be creatable), otherwise ffmpeg would only fail on recording
+        try:
+            os.makedirs(profile["output_dir"], exist_ok=True)
+        except OSError:
+            return False
+
+        return True
+
+    def save(self):
+        """
+        Write profiles to config file
+        """
+        with open(self.file, "w") as f:
+            json.dump({"last_profile": self.last_profile, "profiles": self.profiles}, f, indent=2)
+
+    def get_names(self):
+        return list(self.profiles.keys())
+
+    def get(self, name: str):
+        """
+        Get profile by name and remember it as last used profile
+        :param name: Profile name
+        :return: Profile dict or None if the profile does not exist
+        """
+        if name not in self.profiles:
+            return None
+
+        self.last_profile = name
+        self.save()
+        return self.profiles[name]
+
+    def get_last(self):
+        """
+        Get last used profile
+        :return: Profile dict or None if no profile was used yet
+        """
+        return self.profiles.get(self.last_profile)
+
+    def set(self, name: str, profile: dict):
+        """
+        Add or overwrite profile and remember it as last used profile
+        :param name: Profile name
+        :param profile: Profile dict
+        """
+        self.profiles[name] = profile
+        self.last_profile = name
+        self.save()
@@ -0,0 +1,72 @@
+import time
+import tkinter as tk
+from gui import TransparentSelector
+
+
+def timed(func, times: list):
+    """Wrap func and append the duration of every call (in seconds) to times"""
+    def wrapper(*args, **kwargs):
+        start_time = time.perf_counter()
+        result = func(*args, **kwargs)
+        times.append(time.perf_counter() - start_time)
+        return result
+
+    return wrapper
+
+
+def replay_drag(selector: TransparentSelector, points: list, event_rate: int = 1000):
+    """
+    Replay a synthetic drag through the regular event bindings of the selector and measure event handling latency
+    :param selector: Selector window
+    :param points: List of (x, y) canvas coordinates, the first one is the mouse down position
+    :param event_rate: Motion events per second (e.g. polling rate of a high-refresh mouse)
+    :return: Dict with motion handler and redraw times in ms and the number of events and redraws
+    """
+    motion_times, redraw_times = [], []
+
+    # Redraws are scheduled via the instance attribute, motion events via the canvas binding
+    selector.redraw_selection = timed(selector.redraw_selection, redraw_times)
+    selector.selection_canvas.bind("<Motion>", timed(selector.on_mouse_motion, motion_times))
+
+    selector.selection_canvas.event_generate("<Button-1>", x=points[0][0], y=points[0][1])
+    for x, y in points[1:]:
+        next_event_time = time.perf_counter() + 1 / event_rate
+        selector.selection_canvas.event_generate("<Motion>", x=x, y=y)
+
+        # Keep the event loop running until the next event is due, so scheduled redraws can fire
+        while time.perf_counter() < next_event_time:
+            selector.update()
+
+    selector.redraw_selection()  # Flush pending redraw
+    selector.reset_selection()
+
+    def to_stats(times):
+        times_ms = [t * 1000 for t in times]
+        return {"mean_ms": round(sum(times_ms) / max(1, len(times_ms)), 4),
+                "max_ms": round(max(times_ms, default=0), 4), "calls": len(times_ms)}
+
+    return {"motion": to_stats(motion_times), "redraw": to_stats(redraw_times)}
+
+
+def benchmark_selector(event_count: int = 2000):
+    root = tk.Tk()
+    root.withdraw()
+    selector = TransparentSelector()
+
+    # Diagonal drag over most of the screen
+    width, height = selector.winfo_screenwidth(), selector.winfo_screenheight()
+    points = [(round(width * 0.1 + i * width * 0.8 / event_count), round(height * 0.1 + i * height * 0.8 / event_count))
+              for i in range(event_count + 1)]
+
+    stats = replay_drag(selector, points)
+    print(f"[BENCHMARK] Motion handler: mean {stats['motion']['mean_ms']}ms | max {stats['motion']['max_ms']}ms | "
+          f"{stats['motion']['calls']} events")
+    print(f"[BENCHMARK] Redraw: mean {stats['redraw']['mean_ms']}ms | max {stats['redraw']['max_ms']}ms | "
+          f"{stats['redraw']['calls']} redraws")
+
+    selector.destroy()
+    root.destroy()
+
+
+if __name__ == '__main__':
+    benchmark_selector()
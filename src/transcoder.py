@@ -0,0 +1,144 @@
+import os
+import glob
+import json
+import queue
+import threading
+import subprocess
+
+
+class TranscodeQueue:
+    job_file_suffix = ".job.json"
+
+    def __init__(self, max_jobs: int = 4, verbose: int = 1):
+        self.verbose = verbose
+        self.job_queue = queue.Queue(maxsize=max_jobs)  # Bounded, intermediates are large and should not pile up
+        self.idle_event = threading.Event()  # Cleared while capturing, jobs only start when no capture is running
+        self.idle_event.set()
+        self.resumed_dirs = set()  # Directories already searched for pending jobs
+        self.worker_thread = threading.Thread(target=self._worker, daemon=True)
+        self.worker_thread.start()
+
+    def hold(self):
+        """Don't start new jobs (e.g. while a capture is running and needs the cpu)"""
+        self.idle_event.clear()
+
+    def release(self):
+        """Allow new jobs to start"""
+        self.idle_event.set()
+
+    def submit(self, input_file: str, output_file: str, encoder_args: list, info_queue=None, info: dict = None):
+        """
+        Add transcode job. The job is persisted next to the input file, so unfinished jobs can be resumed later.
+        Never blocks, if too many jobs are pending the job is only kept on disk until the next resume
+        :param input_file: Intermediate video file
+        :param output_file: Final video file
+        :param encoder_args: ffmpeg output arguments of the final profile
+        :param info_queue: Optional queue that gets a "transcoded" status after the job is finished
+        :param info: Additional values for the "transcoded" status
+        :return: True if the job was queued, False if it was deferred to the next resume
+        """
+        job = {"input_file": input_file, "output_file": output_file, "encoder_args": encoder_args}
+
+        # Write atomically, an interrupted write must not leave a broken job file behind
+        job_file = input_file + TranscodeQueue.job_file_suffix
+        with open(job_file + ".tmp", "w") as f:
+            json.dump(job, f)
+        os.replace(job_file + ".tmp", job_file)
+
+        try:
+            self.job_queue.put_nowait((job, info_queue, info))
+        except queue.Full:
+            if self.verbose >= 1:
+                print(f"(!) Transcode queue full, {input_file} is transcoded after the next resume")
+            return False
+
+        return True
+
+    def resume_pending(self, directory: str = "."):
+        """
+        Re-submit jobs left over from a previous session. Runs in a separate thread, since the job queue is bounded.
+        Every directory is only searched once, jobs submitted in this session are already queued
+        :param directory: Directory to search for job files
+        """
+        directory = os.path.abspath(directory)
+        if directory in self.resumed_dirs:
+            return
+        self.resumed_dirs.add(directory)
+
+        threading.Thread(target=self._resume_pending, args=(directory,), daemon=True).start()
+
+    def _resume_pending(self, directory):
+        resumed = 0
+        job_files = glob.glob(os.path.join(directory, "*" + TranscodeQueue.job_file_suffix))
+        for job_file in job_files:
+            # A broken job file only skips this job, not the remaining ones
+            try:
+                with open(job_file) as f:
+                    job = json.load(f)
+
+                # Job file without intermediate cannot be transcoded anymore
+                if not os.path.exists(job["input_file"]):
+                    os.remove(job_file)
+                    continue
+            except (OSError, ValueError, KeyError, TypeError) as e:
+                if self.verbose >= 1:
+                    print(f"(!) Could not resume transcode job {job_file}:", e)
+                continue
+
+            self.job_queue.put((job, None, None))
+            resumed += 1
+
+        if self.verbose >= 1 and resumed > 0:
+            print(f"[INFO] Resumed {resumed} pending transcode jobs")
+
+    def _worker(self):
+        while True:
+            job, info_queue, info = self.job_queue.get()
+            self.idle_event.wait()
+
+            # Errors only fail the job, the worker has to stay alive for later jobs
+            try:
+                output_file = self._transcode(job)
+            except Exception as e:
+                if self.verbose >= 1:
+                    print(f"(!) Transcode of {job['input_file']} failed:", e)
+                output_file = None
+
+            if info_queue is not None:
+                info_queue.put({**(info or {}), "status": "transcoded", "output_file": output_file})
+
+            self.job_queue.task_done()
+
+    def _transcode(self, job):
+        """
+        Run one transcode job
+        :param job: Job dict
+        :return: Path of the output file or None if the job failed (intermediate and job file are kept for a resume)
+        """
+        if self.verbose >= 1:
+            print(f"[TRANSCODE] {job['input_file']} -> {job['output_file']}")
+
+        # Write to temporary file first, an interrupted job never leaves a broken output file behind
+        root, ext = os.path.splitext(job["output_file"])
+        temp_file = f"{root}.part{ext}"
+        result = subprocess.run(
+            [
+                "ffmpeg",
+                "-y",  # Overwrite output file if it exists
+                "-i", job["input_file"],  # Intermediate input
+                *job["encoder_args"],  # Final encoding profile
+                "-threads", "0",  # Use all cores
+                "-loglevel", "error",  # Suppress all but errors
+                temp_file,
+            ]
+        )
+
+        if result.returncode != 0:
+            if self.verbose >= 1:
+                print(f"(!) Transcode of {job['input_file']} failed with code {result.returncode}")
+            return None
+
+        os.replace(temp_file, job["output_file"])
+        os.remove(job["input_file"])
+        os.remove(job["input_file"] + TranscodeQueue.job_file_suffix)
+        return job["output_file"]
@@ -22,8 +22,8 @@ def resize_image(img_array, max_width, max_height):
     scale = min(width_scale, height_scale)
 
     # Calculate new dimensions
-    new_width = int(original_width * scale)
-    new_height = int(original_height * scale)
+    new_width = max(1, int(original_width * scale))  # At least 1px, e.g. for thin strips
+    new_height = max(1, int(original_height * scale))
 
     # Resize the image using OpenCV
     resized_image = cv2.resize(img_array, (new_width, new_height), interpolation=cv2.INTER_AREA)